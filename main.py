@@ -1,75 +1,831 @@
 import os
 import io
+import gzip
+import logging
+import asyncio
+import threading
+import hashlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, Awaitable, Callable, Final, Hashable, Literal, NamedTuple
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse, HTMLResponse
-from pydantic import BaseModel, Field
-from huggingface_hub import InferenceClient
-from PIL import Image
+# Hugging Face API token, read once at startup
+HF_TOKEN: Final[str | None] = os.environ.get("HF_TOKEN")
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, HTMLResponse, ORJSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, ConfigDict, Field
+from huggingface_hub import AsyncInferenceClient
+from huggingface_hub.utils._http import default_async_client_factory
+from huggingface_hub.inference._common import RequestParameters
+from huggingface_hub.inference._providers import get_provider_helper
+from huggingface_hub.inference._providers._common import _fetch_inference_provider_mapping
+from huggingface_hub.errors import HfHubHTTPError, InferenceTimeoutError
+import httpx
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+from PIL import Image, UnidentifiedImageError
+import numpy as np
+import diskcache
+import orjson
+
+# Text-to-image model; FLUX.1-schnell is distilled for few steps and ignores guidance
+IMAGE_MODEL = os.environ.get("IMAGE_MODEL", "black-forest-labs/FLUX.1-schnell")
+
+# Inference provider for image generation ("auto" picks the first one available
+# for the model, following the account's provider order on the Hub)
+IMAGE_PROVIDER = os.environ.get("IMAGE_PROVIDER", "auto")
+
+# Default text-to-video model
+VIDEO_MODEL = "Wan-AI/Wan2.2-T2V-A14B"
+
+logger = logging.getLogger("uvicorn.error")
+
+def resolve_provider(model: str, provider: str) -> str:
+    """Fetch the model's provider mapping once and pick a concrete provider"""
+    # huggingface_hub caches this mapping per process but fetches it with a
+    # blocking call on first use, so warming it here keeps that off the event loop
+    try:
+        mapping = _fetch_inference_provider_mapping(model)
+        if provider == "auto":
+            return mapping[0].provider
+    except Exception as e:
+        # Startup continues with the configured value and huggingface_hub
+        # resolves the provider per request instead
+        logger.warning("Could not fetch inference providers for %s: %s", model, e)
+    return provider
+
+def warm_model_info(provider: str, task: str, model: str) -> None:
+    """Run the provider helper's blocking model lookup once, off the event loop"""
+    # huggingface_hub caches the result per process, like the provider mapping
+    try:
+        get_provider_helper(provider, task=task, model=model)._prepare_mapping_info(model)
+    except Exception as e:
+        logger.warning("Could not fetch %s model info for %s: %s", task, model, e)
+
+# Seconds to wait for a single upstream inference call before giving up with a 504
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", "300"))
+
+# Maximum number of concurrent upstream inference calls per worker
+MAX_CONCURRENT_GENERATIONS = int(os.environ.get("MAX_CONCURRENT_GENERATIONS", "8"))
+# Videos run for minutes, so they get a smaller bound of their own
+MAX_CONCURRENT_VIDEO_GENERATIONS = int(os.environ.get("MAX_CONCURRENT_VIDEO_GENERATIONS", "2"))
+# Requests allowed to wait for a free slot before new ones are rejected with a 503
+MAX_QUEUED_GENERATIONS = int(os.environ.get("MAX_QUEUED_GENERATIONS", "32"))
+# Each queued video waits out a multi-minute generation, so keep that queue short
+MAX_QUEUED_VIDEO_GENERATIONS = int(os.environ.get("MAX_QUEUED_VIDEO_GENERATIONS", "2"))
+# Seconds a request may wait for a free slot before it is rejected with a 503,
+# so nothing is generated for clients that have already given up
+QUEUE_TIMEOUT = float(os.environ.get("QUEUE_TIMEOUT", "30"))
+
+def overloaded_error() -> HTTPException:
+    """503 returned when this server sheds load, as opposed to a busy provider"""
+    return HTTPException(
+        status_code=503,
+        detail="Server is at capacity, try again later",
+        headers={"Retry-After": "10"}
+    )
+
+class ProviderThreads:
+    """Daemon threads for blocking provider polls, capped so stuck polls shed load"""
+
+    def __init__(self, max_threads: int):
+        self.max_threads = max_threads
+        # Threads claimed by in-flight jobs, including polls whose request
+        # already timed out but whose provider loop has not returned yet
+        self.busy = 0
+
+    def reserve(self) -> None:
+        """Claim a thread before submitting a job, or reject the request with a 503"""
+        if self.busy >= self.max_threads:
+            raise overloaded_error()
+        self.busy += 1
+
+    def release(self) -> None:
+        self.busy -= 1
+
+    def run(self, func: Callable[..., Any], *args) -> asyncio.Future:
+        """Run func on a new daemon thread; the reserved claim ends when func returns"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def settle(result: Any, error: BaseException | None) -> None:
+            self.release()
+            if future.cancelled():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        def work() -> None:
+            result, error = None, None
+            try:
+                result = func(*args)
+            except BaseException as e:
+                error = e
+            try:
+                loop.call_soon_threadsafe(settle, result, error)
+            except RuntimeError:
+                # The loop is gone (shutdown), so nothing else touches the counter
+                self.release()
+
+        # Daemon threads, unlike executor workers, are not joined at exit,
+        # so a provider that never finishes cannot block shutdown
+        threading.Thread(target=work, name="provider", daemon=True).start()
+        return future
+
+# Threads for provider polling and result downloads, one per generation slot,
+# kept off the default executor that image encoding and disk I/O run on
+PROVIDER_THREADS = ProviderThreads(MAX_CONCURRENT_GENERATIONS + MAX_CONCURRENT_VIDEO_GENERATIONS)
+
+# Connection pool shared by the inference clients, kept warm between requests
+HTTP_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100)
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build the httpx client shared by the inference clients, with a tuned pool and HTTP/2"""
+    # Reuse huggingface_hub's hooks and timeouts, only swapping the transport
+    default = default_async_client_factory()
+    return httpx.AsyncClient(
+        http2=True,
+        limits=HTTP_LIMITS,
+        event_hooks=default.event_hooks,
+        follow_redirects=default.follow_redirects,
+        timeout=default.timeout,
+    )
+
+def share_http_client(client: AsyncInferenceClient, http_client: httpx.AsyncClient) -> None:
+    """Make an AsyncInferenceClient send its requests through a shared httpx client"""
+    # AsyncInferenceClient has no public hook for this; it lazily creates and
+    # owns a client in _async_client, so presetting it skips that and leaves
+    # closing the shared client to the lifespan handler
+    client._async_client = http_client
+
+# Number of generated images kept in memory per worker (0 disables caching)
+IMAGE_CACHE_SIZE = int(os.environ.get("IMAGE_CACHE_SIZE", "256"))
+
+class EncodedImage(NamedTuple):
+    """Encoded response body together with its media type"""
+    data: bytes
+    media_type: str
+
+class ImageCache:
+    """In-memory LRU cache of encoded images"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, EncodedImage] = OrderedDict()
+
+    @staticmethod
+    def make_key(prompt: str, variant: tuple, thumbnail: bool = False) -> tuple:
+        """Build a cache key from the normalized prompt and output options"""
+        normalized = prompt.strip().lower().encode("utf-8")
+        return (hashlib.blake2b(normalized).digest(), *variant, thumbnail)
+
+    # Only accessed from the event loop without awaiting in between,
+    # so no lock is needed around the OrderedDict operations
+    def get(self, key: tuple) -> EncodedImage | None:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: tuple, value: EncodedImage) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+# Sentence embedding model used to match paraphrased prompts
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Cosine similarity above which a cached image is reused for a different prompt
+# (unset disables the semantic cache)
+SEMANTIC_CACHE_THRESHOLD = os.environ.get("SEMANTIC_CACHE_THRESHOLD")
+
+# Directory used to persist the semantic cache across restarts (optional)
+SEMANTIC_CACHE_DIR = os.environ.get("SEMANTIC_CACHE_DIR")
+
+# Images indexed by the semantic cache; lookups scan every row, which takes
+# well under a millisecond at the default size, so no ANN index is needed
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", "10000"))
+
+class SemanticCache:
+    """Image cache that also matches near-duplicate prompts by embedding similarity"""
+
+    def __init__(
+        self,
+        client: AsyncInferenceClient,
+        threshold: float,
+        directory: str | None = None,
+        max_entries: int = 10_000,
+        max_embeddings: int = 4096,
+    ):
+        self.client = client
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_embeddings = max_embeddings
+        # Images and embeddings live on disk when a directory is given
+        self._store = diskcache.Cache(directory) if directory else {}
+        # Memoized prompt embeddings, so repeated prompts skip the embedding call
+        self._embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+        # Brute-force index: a fixed-size ring of normalized embedding rows, one
+        # per cached image, allocated once and overwritten oldest-first when full.
+        # Each row also records which (width, height, format, quality) variant
+        # it was generated for, as a small integer id
+        self._matrix: np.ndarray | None = None
+        self._keys: list[str | None] = [None] * max_entries
+        self._variant_ids = np.full(max_entries, -1, dtype=np.int32)
+        self._variant_index: dict[tuple, int] = {}
+        self._slots: dict[str, int] = {}
+        self._size = 0
+        self._next = 0
+        # Insertion counter stored with each entry, so a reload keeps FIFO order
+        self._sequence = 0
+        # Background adds, referenced so they are not garbage collected mid-flight
+        self._pending: set[asyncio.Task] = set()
+        if directory:
+            self._load()
+
+    @staticmethod
+    def make_key(prompt: str, variant: tuple) -> str:
+        normalized = prompt.strip().lower()
+        options = ".".join(map(str, variant))
+        return hashlib.sha256(f"{options}:{normalized}".encode("utf-8")).hexdigest()
+
+    def _insert(self, key: str, embedding: np.ndarray, variant: tuple) -> str | None:
+        """Place an entry in the next ring slot and return the key it evicted"""
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_entries, embedding.shape[-1]), dtype=np.float32)
+        slot = self._next
+        evicted = self._keys[slot]
+        if evicted is not None:
+            del self._slots[evicted]
+
+        self._matrix[slot] = embedding
+        self._keys[slot] = key
+        self._variant_ids[slot] = self._variant_index.setdefault(variant, len(self._variant_index))
+        self._slots[key] = slot
+        self._next = (slot + 1) % self.max_entries
+        self._size = min(self._size + 1, self.max_entries)
+        return evicted
+
+    def _load(self) -> None:
+        """Rebuild the in-memory index from the persisted embeddings, oldest first"""
+        records = []
+        stale = []
+        for name in self._store.iterkeys():
+            if not name.startswith("emb:"):
+                continue
+            key = name[len("emb:"):]
+            record = self._store.get(name)
+            # Entries written without a sequence number cannot be ordered, drop them
+            if not (isinstance(record, tuple) and len(record) == 3 and isinstance(record[0], int)):
+                stale.append(key)
+                continue
+            sequence, embedding, variant = record
+            records.append((sequence, key, embedding, variant))
+
+        # Keep only the newest max_entries, in the order they were added
+        records.sort(key=lambda record: record[0])
+        excess = max(len(records) - self.max_entries, 0)
+        stale.extend(key for _, key, _, _ in records[:excess])
+        for _, key, embedding, variant in records[excess:]:
+            self._insert(key, np.frombuffer(embedding, dtype=np.float16).astype(np.float32), variant)
+        if records:
+            self._sequence = records[-1][0] + 1
+        for key in stale:
+            self._discard(key)
+
+    async def _read(self, key: str) -> bytes | None:
+        if isinstance(self._store, dict):
+            return self._store.get(key)
+        return await asyncio.to_thread(self._store.get, key)
+
+    async def _write(self, key: str, data: bytes, embedding: np.ndarray, variant: tuple) -> None:
+        record = (self._sequence, embedding.astype(np.float16).tobytes(), variant)
+        self._sequence += 1
+        if isinstance(self._store, dict):
+            self._store[key] = data
+            self._store["emb:" + key] = record
+        else:
+            await asyncio.to_thread(self._store.set, key, data)
+            await asyncio.to_thread(self._store.set, "emb:" + key, record)
+
+    def _discard(self, key: str) -> None:
+        self._store.pop(key, None)
+        self._store.pop("emb:" + key, None)
+
+    async def _delete(self, key: str) -> None:
+        if isinstance(self._store, dict):
+            self._discard(key)
+        else:
+            await asyncio.to_thread(self._discard, key)
+
+    async def embed(self, prompt: str) -> np.ndarray:
+        """Return the normalized embedding of a prompt, computing it at most once"""
+        normalized = prompt.strip().lower()
+        embedding = self._embeddings.get(normalized)
+        if embedding is not None:
+            self._embeddings.move_to_end(normalized)
+            return embedding
+
+        embedding = await self.client.feature_extraction(normalized, model=EMBEDDING_MODEL)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        # Some providers return one vector per token, pool them into one
+        if embedding.ndim > 1:
+            embedding = embedding.reshape(-1, embedding.shape[-1]).mean(axis=0)
+        embedding /= np.linalg.norm(embedding) or 1.0
+
+        self._embeddings[normalized] = embedding
+        while len(self._embeddings) > self.max_embeddings:
+            self._embeddings.popitem(last=False)
+        return embedding
+
+    async def lookup(self, prompt: str, variant: tuple) -> bytes | None:
+        """Return a cached image for this prompt or a sufficiently similar one"""
+        key = self.make_key(prompt, variant)
+        data = await self._read(key)
+        variant_id = self._variant_index.get(variant)
+        if data is not None or variant_id is None:
+            return data
+
+        # The cache must never fail a generation, so embedding errors are a miss
+        try:
+            embedding = await self.embed(prompt)
+        except Exception:
+            return None
+
+        similarities = self._matrix[:self._size] @ embedding
+        similarities[self._variant_ids[:self._size] != variant_id] = -1.0
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return await self._read(self._keys[best])
+
+    async def add(self, prompt: str, variant: tuple, data: bytes) -> None:
+        """Store a generated image together with its prompt embedding"""
+        try:
+            embedding = await self.embed(prompt)
+        except Exception:
+            return
+
+        key = self.make_key(prompt, variant)
+        if key in self._slots:
+            return
+        await self._write(key, data, embedding, variant)
+        # A concurrent add may have indexed the same key while writing
+        if key in self._slots:
+            return
+
+        # Once the ring is full the oldest entry is overwritten; drop its files too
+        evicted = self._insert(key, embedding, variant)
+        if evicted is not None:
+            await self._delete(evicted)
+
+    def add_later(self, prompt: str, variant: tuple, data: bytes) -> None:
+        """Index a generated image in the background so the response is not delayed"""
+        task = asyncio.create_task(self.add(prompt, variant, data))
+        self._pending.add(task)
+        task.add_done_callback(self._finish)
+
+    def _finish(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Could not add image to the semantic cache: %s", task.exception())
+
+    async def drain(self) -> None:
+        """Wait for background adds to finish before the store is closed"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def close(self) -> None:
+        if not isinstance(self._store, dict):
+            self._store.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the Hugging Face clients once and close them on shutdown"""
+    # Report a missing token at boot rather than on the first generation;
+    # the app still starts so /health can surface it
+    if not HF_TOKEN:
+        logger.warning("HF_TOKEN is not set; generation endpoints will return 500")
+
+    # Both clients talk to the Hugging Face router, so one pool lets them
+    # reuse each other's keep-alive TLS connections
+    app.state.http_client = create_http_client()
+
+    # Resolve providers once at startup instead of on the first request
+    warmups = [
+        asyncio.to_thread(resolve_provider, IMAGE_MODEL, IMAGE_PROVIDER),
+        asyncio.to_thread(resolve_provider, VIDEO_MODEL, "replicate"),
+    ]
+    if SEMANTIC_CACHE_THRESHOLD:
+        warmups.append(asyncio.to_thread(warm_model_info, "hf-inference", "feature-extraction", EMBEDDING_MODEL))
+    image_provider, *_ = await asyncio.gather(*warmups)
+
+    # Image generation uses the resolved provider (auto by default)
+    app.state.image_client = AsyncInferenceClient(
+        provider=image_provider,
+        api_key=HF_TOKEN,
+        timeout=INFERENCE_TIMEOUT,
+    )
+    share_http_client(app.state.image_client, app.state.http_client)
+    # Only prompt and size vary between image requests
+    app.state.generate_flux = partial(text_to_image, app.state.image_client, model=IMAGE_MODEL)
+
+    # Video generation uses replicate provider
+    app.state.video_client = AsyncInferenceClient(
+        provider="replicate",
+        api_key=HF_TOKEN,
+        timeout=INFERENCE_TIMEOUT,
+    )
+    share_http_client(app.state.video_client, app.state.http_client)
+
+    # Cap fan-out to the providers to avoid connection errors under load,
+    # rejecting new requests once too many are already waiting
+    app.state.image_limiter = InferenceLimiter(MAX_CONCURRENT_GENERATIONS, MAX_QUEUED_GENERATIONS, QUEUE_TIMEOUT)
+    app.state.video_limiter = InferenceLimiter(
+        MAX_CONCURRENT_VIDEO_GENERATIONS, MAX_QUEUED_VIDEO_GENERATIONS, QUEUE_TIMEOUT
+    )
+
+    # Repeated prompts are served from memory instead of re-running inference
+    app.state.image_cache = ImageCache(IMAGE_CACHE_SIZE)
+    app.state.coalescer = RequestCoalescer()
+
+    # Optionally reuse images for paraphrased prompts, persisted across restarts
+    app.state.semantic_cache = None
+    if SEMANTIC_CACHE_THRESHOLD:
+        # Embeddings always come from HF Inference, since most image providers
+        # (fal-ai, replicate, together...) do not serve feature extraction
+        embedding_client = AsyncInferenceClient(
+            provider="hf-inference",
+            api_key=HF_TOKEN,
+            timeout=INFERENCE_TIMEOUT,
+        )
+        share_http_client(embedding_client, app.state.http_client)
+        app.state.semantic_cache = SemanticCache(
+            embedding_client,
+            float(SEMANTIC_CACHE_THRESHOLD),
+            directory=SEMANTIC_CACHE_DIR,
+            max_entries=SEMANTIC_CACHE_SIZE,
+        )
+
+    yield
+
+    await app.state.image_client.close()
+    await app.state.video_client.close()
+    if app.state.semantic_cache is not None:
+        await app.state.semantic_cache.drain()
+        await app.state.semantic_cache.client.close()
+        app.state.semantic_cache.close()
+    await app.state.http_client.aclose()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="HuggingFace Image Generator API",
     description="Generate images from text prompts using FLUX.1-schnell model",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Serialize JSON responses with orjson instead of the stdlib json module
+    default_response_class=ORJSONResponse
 )
 
-# Initialize Hugging Face clients
-# Image generation uses auto provider
-image_client = InferenceClient(
-    provider="auto",
-    api_key=os.environ.get("HF_TOKEN"),
-)
+# Endpoints returning already-compressed media that gzip would only slow down,
+# plus the index page, which is compressed once at import instead
+UNCOMPRESSED_PATHS = {"/", "/generate", "/generate-video"}
 
-# Video generation uses replicate provider
-video_client = InferenceClient(
-    provider="replicate",
-    api_key=os.environ.get("HF_TOKEN"),
-)
+class TextGZipMiddleware(GZipMiddleware):
+    """Gzip text responses (HTML, JSON, docs) but pass generated media through"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in UNCOMPRESSED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(TextGZipMiddleware, minimum_size=1000)
 
 # Request model with validation
 class ImageGenerationRequest(BaseModel):
     prompt: str = Field(..., description="Text prompt to generate image from", min_length=1)
     width: int = Field(1024, description="Image width in pixels", ge=256, le=2048)
     height: int = Field(576, description="Image height in pixels (default 16:9 ratio)", ge=256, le=2048)
-    guidance_scale: float = Field(7.5, description="Guidance scale for generation", ge=1.0, le=20.0)
-    num_inference_steps: int = Field(4, description="Number of inference steps", ge=1, le=50)
+    format: Literal["jpeg", "webp", "png"] = Field("jpeg", description="Output image format")
+    quality: int | None = Field(
+        None,
+        description="JPEG/WebP quality (ignored for PNG); by default the provider's image is kept "
+                    "when it is already in the requested format, otherwise 85 is used",
+        ge=1,
+        le=100
+    )
+    thumbnail: bool = Field(
+        False,
+        description="Also return a 1/4 scale thumbnail; the response becomes multipart/mixed"
+    )
 
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        frozen=True,
+        json_schema_extra={
             "example": {
                 "prompt": "3 well adorned African priests riding horses in early Jerusalem, following the stars, cinematic lighting, 4k",
                 "width": 1024,
                 "height": 576,
-                "guidance_scale": 7.5,
-                "num_inference_steps": 4
+                "format": "jpeg"
             }
         }
+    )
+
+    @property
+    def output_options(self) -> tuple:
+        """Options that change the encoded bytes for a given prompt"""
+        return (self.width, self.height, self.format, self.quality)
 
 # Video generation request model
 class VideoGenerationRequest(BaseModel):
     prompt: str = Field(..., description="Text prompt to generate video from", min_length=1)
     model: str = Field(
-        "Wan-AI/Wan2.2-T2V-A14B",
+        VIDEO_MODEL,
         description="Model to use for video generation"
     )
 
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        frozen=True,
+        json_schema_extra={
             "example": {
                 "prompt": "A young man walking on the street waving an Algerian flag, smiling",
                 "model": "Wan-AI/Wan2.2-T2V-A14B"
             }
         }
+    )
 
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    """Root endpoint - Interactive HTML interface"""
-    html_content = """
+# Health check response model
+class HealthResponse(BaseModel):
+    status: str = Field(..., description="API status")
+    hf_token_configured: bool = Field(..., description="Whether HF_TOKEN is set")
+
+# Pillow format, media type, file extension and encoder options per output format
+# JPEG and WebP are far smaller and faster to encode than PNG for generated photos;
+# PNG uses compress_level=1, several times faster than the default of 6
+IMAGE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", "jpg", {"quality": 85, "optimize": False, "progressive": False}),
+    "webp": ("WEBP", "image/webp", "webp", {"quality": 85, "method": 0}),
+    "png": ("PNG", "image/png", "png", {"compress_level": 1, "optimize": False}),
+}
+
+def make_etag(payload: bytes) -> str:
+    """Strong ETag derived from the response body"""
+    return f'"{hashlib.blake2b(payload, digest_size=16).hexdigest()}"'
+
+def request_etag(cache_key: tuple) -> str:
+    """Weak ETag derived from the canonical request rather than the image bytes"""
+    # Generation is not deterministic, so different workers may hold different
+    # but equivalent images for one request; a weak validator says exactly that
+    return f'W/"{hashlib.blake2b(repr(cache_key).encode("utf-8"), digest_size=16).hexdigest()}"'
+
+def encode_image(image: Image.Image, image_format: str, quality: int | None = None) -> EncodedImage:
+    """Encode a PIL Image in the requested output format"""
+    pil_format, _, _, options = IMAGE_FORMATS[image_format]
+    # Quality only applies to the lossy formats; PNG ignores it
+    if quality is not None and "quality" in options:
+        options = {**options, "quality": quality}
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return EncodedImage(buffer.getvalue(), IMAGE_FORMATS[image_format][1])
+
+# Thumbnails are the generated image downscaled by this factor
+THUMBNAIL_FACTOR = 4
+# Image modes that Image.reduce accepts as they are
+REDUCIBLE_MODES = {"RGB", "RGBA", "L", "LA", "CMYK"}
+
+def passthrough_image(data: bytes, image_format: str) -> EncodedImage | None:
+    """Reuse the provider's encoded image when it is already in the requested format"""
+    pil_format, media_type, _, _ = IMAGE_FORMATS[image_format]
+    # Image.open only parses the header, so this costs no decode
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.format != pil_format:
+                return None
+    except UnidentifiedImageError:
+        return None
+    return EncodedImage(data, media_type)
+
+def decode_image(data: bytes) -> Image.Image:
+    """Decode the image bytes returned by the provider"""
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+def transcode_image(data: bytes, image_format: str, quality: int | None = None) -> EncodedImage:
+    """Decode the provider's image and re-encode it in the requested format"""
+    return encode_image(decode_image(data), image_format, quality)
+
+def encode_thumbnail(image: Image.Image, image_format: str, quality: int | None = None) -> EncodedImage:
+    """Downscale and encode a thumbnail of a generated image"""
+    # Image.reduce only supports a few modes; palette, bilevel and 16-bit
+    # images (e.g. a palette PNG from the provider) are converted first
+    if image.mode not in REDUCIBLE_MODES:
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    return encode_image(image.reduce(THUMBNAIL_FACTOR), image_format, quality)
+
+def build_multipart(parts: list[tuple[str, EncodedImage]]) -> EncodedImage:
+    """Bundle (filename, image) parts into a single multipart/mixed body"""
+    # A digest of the parts is a boundary that cannot collide with their content in practice
+    digest = hashlib.blake2b(digest_size=16)
+    for _, part in parts:
+        digest.update(part.data)
+    boundary = digest.hexdigest()
+
+    chunks = []
+    for filename, part in parts:
+        chunks.append(
+            f"--{boundary}\r\n"
+            f"Content-Type: {part.media_type}\r\n"
+            f"Content-Disposition: inline; filename={filename}\r\n\r\n".encode("ascii")
+        )
+        chunks.append(part.data)
+        chunks.append(b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode("ascii"))
+    return EncodedImage(b"".join(chunks), f"multipart/mixed; boundary={boundary}")
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag, using weak comparison"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+class RequestCoalescer:
+    """Share a single in-flight task between concurrent identical requests"""
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shield so one client disconnecting does not cancel the others' result
+        return await asyncio.shield(task)
+
+class InferenceLimiter:
+    """Bound concurrent upstream calls and shed load once too many are waiting"""
+
+    def __init__(self, max_concurrent: int, max_queued: int, max_wait: float):
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self._queued = 0
+
+    async def __aenter__(self):
+        # Fail fast instead of queueing requests that would only time out
+        if self._semaphore.locked() and self._queued >= self.max_queued:
+            raise overloaded_error()
+        self._queued += 1
+        try:
+            async with asyncio.timeout(self.max_wait):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            raise overloaded_error() from None
+        finally:
+            self._queued -= 1
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore.release()
+
+# Upstream statuses worth retrying and passing through to the client
+RETRYABLE_STATUS_CODES = {429, 503}
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a provider error is transient (rate limited or unavailable)"""
+    return (
+        isinstance(error, HfHubHTTPError)
+        and error.response is not None
+        and error.response.status_code in RETRYABLE_STATUS_CODES
+    )
+
+# Retry transient provider errors with exponential backoff
+provider_retry = retry(
+    retry=retry_if_exception(is_retryable),
+    wait=wait_exponential(multiplier=0.5, max=8),
+    stop=stop_after_attempt(3),
+    reraise=True,
+)
+
+def upstream_error(error: httpx.HTTPError, action: str) -> HTTPException:
+    """Map a provider failure to a short HTTP error without echoing the upstream body"""
+    if isinstance(error, (InferenceTimeoutError, httpx.TimeoutException)):
+        return HTTPException(status_code=504, detail=f"{action} timed out")
+    if is_retryable(error):
+        status_code = error.response.status_code
+        # Pass the provider's backoff hint on so clients know when to retry
+        retry_after = error.response.headers.get("retry-after")
+        return HTTPException(
+            status_code=status_code,
+            detail=f"{action} provider is busy, try again later",
+            headers={"Retry-After": retry_after} if retry_after else None
+        )
+    return HTTPException(status_code=502, detail=f"{action} failed upstream")
+
+@provider_retry
+async def submit_provider_task(client: AsyncInferenceClient, request_parameters: RequestParameters) -> Any:
+    # Only the submission is retried: once a job is accepted, retrying a failed
+    # status poll would start (and bill) a second generation
+    return await client._inner_post(request_parameters)
+
+async def run_provider_task(client: AsyncInferenceClient, task: str, prompt: str, model: str | None, parameters: dict) -> bytes:
+    """Run a generation task and return the provider's raw output bytes"""
+    # Queue-based providers poll for the result and download the finished file
+    # with blocking calls inside get_response, so only the submission itself
+    # runs on the event loop and the polling is moved to a provider thread
+    def prepare():
+        helper = get_provider_helper(client.provider, task=task, model=model)
+        request_parameters = helper.prepare_request(
+            inputs=prompt,
+            parameters=parameters,
+            headers=client.headers,
+            model=model,
+            api_key=client.token,
+        )
+        return helper, request_parameters
+
+    # Claim the polling thread before submitting, so a job is never billed
+    # while every thread is held by polls that have not returned
+    PROVIDER_THREADS.reserve()
+    polling = False
+    try:
+        # One deadline covers preparing, submitting and polling. A blocking poll
+        # cannot be interrupted, so its thread stays claimed until the provider
+        # returns, but the request gets its 504 on time
+        async with asyncio.timeout(INFERENCE_TIMEOUT):
+            helper, request_parameters = await asyncio.to_thread(prepare)
+            response = await submit_provider_task(client, request_parameters)
+            polling = True
+            return await PROVIDER_THREADS.run(helper.get_response, response, request_parameters)
+    except TimeoutError as e:
+        raise InferenceTimeoutError(f"{task} did not finish within {INFERENCE_TIMEOUT:g}s") from e
+    finally:
+        if not polling:
+            PROVIDER_THREADS.release()
+
+async def text_to_image(client: AsyncInferenceClient, prompt: str, model: str | None = None, **parameters) -> bytes:
+    # Unlike client.text_to_image, keep the encoded bytes instead of decoding them
+    return await run_provider_task(client, "text-to-image", prompt, model, parameters)
+
+async def text_to_video(client: AsyncInferenceClient, prompt: str, model: str | None = None, **parameters) -> bytes:
+    return await run_provider_task(client, "text-to-video", prompt, model, parameters)
+
+async def render_image(state, request: ImageGenerationRequest, cache_key: tuple) -> EncodedImage:
+    """Generate, encode and cache an image for a request that missed the cache"""
+    # Generate image using Hugging Face Inference API
+    async with state.image_limiter:
+        data = await state.generate_flux(request.prompt, width=request.width, height=request.height)
+
+    # Providers already return an encoded image; when it is in the requested
+    # format and no quality was asked for, it is sent without a decode/encode
+    full = None
+    if request.quality is None:
+        full = passthrough_image(data, request.format)
+
+    # Decode and encode off the event loop
+    if request.thumbnail:
+        extension = IMAGE_FORMATS[request.format][2]
+        image = await asyncio.to_thread(decode_image, data)
+        thumbnail = asyncio.to_thread(encode_thumbnail, image, request.format, request.quality)
+        if full is None:
+            # Encode the image and its thumbnail concurrently in worker threads
+            full, thumb = await asyncio.gather(
+                asyncio.to_thread(encode_image, image, request.format, request.quality),
+                thumbnail,
+            )
+        else:
+            thumb = await thumbnail
+        encoded = build_multipart([
+            (f"generated_image.{extension}", full),
+            (f"thumbnail.{extension}", thumb),
+        ])
+    else:
+        encoded = full or await asyncio.to_thread(transcode_image, data, request.format, request.quality)
+
+    state.image_cache.set(cache_key, encoded)
+    if state.semantic_cache is not None and not request.thumbnail:
+        # Embedding and disk writes happen after the response, not before it
+        state.semantic_cache.add_later(request.prompt, request.output_options, encoded.data)
+    return encoded
+
+# Interactive HTML interface, encoded once at import
+INDEX_HTML = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -145,6 +901,7 @@ async def root():
             
             input[type="text"],
             input[type="number"],
+            select,
             textarea {
                 width: 100%;
                 padding: 12px;
@@ -155,6 +912,7 @@ async def root():
             }
             
             input:focus,
+            select:focus,
             textarea:focus {
                 outline: none;
                 border-color: #667eea;
@@ -435,15 +1193,13 @@ async def root():
                                 <input type="number" id="height" value="576" min="256" max="2048" required>
                             </div>
                         </div>
-                        <div class="form-row">
-                            <div class="form-group">
-                                <label for="guidanceScale">Guidance Scale</label>
-                                <input type="number" id="guidanceScale" value="7.5" min="1" max="20" step="0.5" required>
-                            </div>
-                            <div class="form-group">
-                                <label for="steps">Inference Steps</label>
-                                <input type="number" id="steps" value="4" min="1" max="50" required>
-                            </div>
+                        <div class="form-group">
+                            <label for="format">Format</label>
+                            <select id="format">
+                                <option value="jpeg" selected>JPEG</option>
+                                <option value="webp">WebP</option>
+                                <option value="png">PNG</option>
+                            </select>
                         </div>
                         <button type="submit">Generate Image</button>
                     </form>
@@ -487,7 +1243,7 @@ async def root():
                         <span class="endpoint-path">/generate</span>
                     </div>
                     <p class="endpoint-description">
-                        Generate an image from a text prompt using the FLUX.1-schnell model. Returns a PNG image file.
+                        Generate an image from a text prompt using the FLUX.1-schnell model. Returns a JPEG image by default, or WebP/PNG on request.
                     </p>
                     
                     <strong>Request Body:</strong>
@@ -520,16 +1276,22 @@ async def root():
                                 <td>Image height in pixels (256-2048, default: 576)</td>
                             </tr>
                             <tr>
-                                <td><code>guidance_scale</code></td>
-                                <td>float</td>
+                                <td><code>format</code></td>
+                                <td>string</td>
                                 <td>No</td>
-                                <td>Guidance scale for generation (1.0-20.0, default: 7.5)</td>
+                                <td>Output format: "jpeg", "webp" or "png" (default: "jpeg")</td>
                             </tr>
                             <tr>
-                                <td><code>num_inference_steps</code></td>
+                                <td><code>quality</code></td>
                                 <td>integer</td>
                                 <td>No</td>
-                                <td>Number of inference steps (1-50, default: 4)</td>
+                                <td>JPEG/WebP quality (1-100, ignored for PNG). By default the provider's image is returned as-is when already in the requested format, otherwise 85</td>
+                            </tr>
+                            <tr>
+                                <td><code>thumbnail</code></td>
+                                <td>boolean</td>
+                                <td>No</td>
+                                <td>Also return a 1/4 scale thumbnail as a multipart/mixed response (default: false)</td>
                             </tr>
                         </tbody>
                     </table>
@@ -540,11 +1302,9 @@ async def root():
   -d '{
     "prompt": "3 well adorned African priests riding horses in early Jerusalem, following the stars, cinematic lighting, 4k",
     "width": 1024,
-    "height": 576,
-    "guidance_scale": 7.5,
-    "num_inference_steps": 4
+    "height": 576
   }' \\
-  --output generated_image.png</div>
+  --output generated_image.jpg</div>
                     
                     <strong>Example Python Request:</strong>
                     <div class="code-block">import requests
@@ -554,13 +1314,11 @@ response = requests.post(
     json={
         "prompt": "3 well adorned African priests riding horses in early Jerusalem, following the stars, cinematic lighting, 4k",
         "width": 1024,
-        "height": 576,
-        "guidance_scale": 7.5,
-        "num_inference_steps": 4
+        "height": 576
     }
 )
 
-with open("generated_image.png", "wb") as f:
+with open("generated_image.jpg", "wb") as f:
     f.write(response.content)</div>
                 </div>
                 
@@ -667,23 +1425,23 @@ with open("generated_video.mp4", "wb") as f:
                             prompt: document.getElementById('imagePrompt').value,
                             width: parseInt(document.getElementById('width').value),
                             height: parseInt(document.getElementById('height').value),
-                            guidance_scale: parseFloat(document.getElementById('guidanceScale').value),
-                            num_inference_steps: parseInt(document.getElementById('steps').value)
+                            format: document.getElementById('format').value
                         })
                     });
                     
                     if (!response.ok) {
-                        const error = await response.json();
+                        const error = await response.json().catch(() => ({}));
                         throw new Error(error.detail || 'Generation failed');
                     }
                     
                     const blob = await response.blob();
                     const imageUrl = URL.createObjectURL(blob);
+                    const extension = {'image/jpeg': 'jpg', 'image/webp': 'webp'}[blob.type] || 'png';
                     
                     resultDiv.innerHTML = `
                         <img src="${imageUrl}" alt="Generated Image">
                         <p style="margin-top: 15px;">
-                            <a href="${imageUrl}" download="generated_image.png" style="color: #667eea; text-decoration: none; font-weight: 600;">
+                            <a href="${imageUrl}" download="generated_image.${extension}" style="color: #667eea; text-decoration: none; font-weight: 600;">
                                 📥 Download Image
                             </a>
                         </p>
@@ -718,7 +1476,7 @@ with open("generated_video.mp4", "wb") as f:
                     });
                     
                     if (!response.ok) {
-                        const error = await response.json();
+                        const error = await response.json().catch(() => ({}));
                         throw new Error(error.detail || 'Generation failed');
                     }
                     
@@ -746,101 +1504,159 @@ with open("generated_video.mp4", "wb") as f:
     </body>
     </html>
     """
-    return HTMLResponse(content=html_content)
+INDEX_HTML_BODY = INDEX_HTML.encode("utf-8")
+INDEX_HTML_GZIP = gzip.compress(INDEX_HTML_BODY, compresslevel=9, mtime=0)
+# Each content-coding is a distinct representation, so each gets its own strong ETag
+INDEX_HTML_ETAG = make_etag(INDEX_HTML_BODY)
+INDEX_HTML_GZIP_ETAG = make_etag(INDEX_HTML_GZIP)
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    """Whether an Accept-Encoding header allows gzip, honoring q=0 exclusions"""
+    wildcard = False
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding in ("gzip", "x-gzip"):
+            return quality > 0
+        if coding == "*":
+            wildcard = quality > 0
+    return wildcard
+
+@app.get("/", response_class=HTMLResponse)
+async def root(request: Request):
+    """Root endpoint - Interactive HTML interface"""
+    if accepts_gzip(request.headers.get("accept-encoding")):
+        body, etag = INDEX_HTML_GZIP, INDEX_HTML_GZIP_ETAG
+    else:
+        body, etag = INDEX_HTML_BODY, INDEX_HTML_ETAG
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=3600",
+        "Vary": "Accept-Encoding"
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if body is INDEX_HTML_GZIP:
+        headers["Content-Encoding"] = "gzip"
+    return HTMLResponse(content=body, headers=headers)
+
+# The health payload only depends on startup configuration, so serialize it once
+HEALTH_BODY = orjson.dumps({
+    "status": "healthy",
+    "hf_token_configured": bool(HF_TOKEN)
+})
 
-@app.get("/health")
+@app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
-    hf_token = os.environ.get("HF_TOKEN")
-    return {
-        "status": "healthy",
-        "hf_token_configured": bool(hf_token)
-    }
+    return Response(content=HEALTH_BODY, media_type="application/json")
+
+# Response header values that never change, built once instead of per request
+IMAGE_CACHE_CONTROL = "public, max-age=3600, immutable"
+IMAGE_DISPOSITIONS = {
+    name: f"inline; filename=generated_image.{extension}"
+    for name, (_, _, extension, _) in IMAGE_FORMATS.items()
+}
+VIDEO_HEADERS = {"Content-Disposition": "inline; filename=generated_video.mp4"}
 
-@app.post("/generate", response_class=StreamingResponse)
-async def generate_image(request: ImageGenerationRequest):
+@app.post("/generate", response_class=Response)
+async def generate_image(request: ImageGenerationRequest, http_request: Request):
     """
     Generate an image from a text prompt using FLUX.1-schnell model
 
-    Returns the image directly as a PNG file (16:9 aspect ratio by default)
+    Returns the image directly as a JPEG, WebP or PNG file (16:9 aspect ratio by default),
+    or a multipart/mixed body with the image and a thumbnail when requested
     """
+    # Check if HF_TOKEN is set
+    if not HF_TOKEN:
+        raise HTTPException(
+            status_code=500,
+            detail="HF_TOKEN environment variable not set"
+        )
+
     try:
-        # Check if HF_TOKEN is set
-        if not os.environ.get("HF_TOKEN"):
-            raise HTTPException(
-                status_code=500, 
-                detail="HF_TOKEN environment variable not set"
+        state = http_request.app.state
+        cache_key = ImageCache.make_key(request.prompt, request.output_options, request.thumbnail)
+
+        # Clients that already hold an image for this request get an empty 304
+        # before any cache lookup or inference
+        etag = request_etag(cache_key)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMAGE_CACHE_CONTROL
+        }
+        if etag_matches(http_request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        # Serve repeated prompts straight from the cache
+        encoded = state.image_cache.get(cache_key)
+        if encoded is None and state.semantic_cache is not None and not request.thumbnail:
+            data = await state.semantic_cache.lookup(request.prompt, request.output_options)
+            if data is not None:
+                encoded = EncodedImage(data, IMAGE_FORMATS[request.format][1])
+                state.image_cache.set(cache_key, encoded)
+
+        if encoded is None:
+            # Identical requests already in flight share one inference call
+            encoded = await state.coalescer.run(
+                cache_key, lambda: render_image(state, request, cache_key)
             )
-        
-        # Generate image using Hugging Face Inference API
-        image = image_client.text_to_image(
-            request.prompt,
-            model="black-forest-labs/FLUX.1-schnell",
-            width=request.width,
-            height=request.height,
-            # Note: FLUX.1-schnell is optimized for speed with fewer steps
-            # Some parameters may not be supported by this specific model
-        )
-        
-        # Convert PIL Image to bytes
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        
-        # Return image as streaming response
-        return StreamingResponse(
-            img_byte_arr, 
-            media_type="image/png",
-            headers={
-                "Content-Disposition": f"inline; filename=generated_image.png"
-            }
+
+        # Multipart bodies name each part, a single image names the whole response
+        if not request.thumbnail:
+            headers["Content-Disposition"] = IMAGE_DISPOSITIONS[request.format]
+
+        # Return the already-encoded image in a single response body
+        return Response(
+            content=encoded.data,
+            media_type=encoded.media_type,
+            headers=headers
         )
         
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Image generation failed: {str(e)}"
-        )
+    except httpx.HTTPError as e:
+        raise upstream_error(e, "Image generation") from e
 
-@app.post("/generate-video", response_class=StreamingResponse)
-async def generate_video(request: VideoGenerationRequest):
+@app.post("/generate-video", response_class=Response)
+async def generate_video(request: VideoGenerationRequest, http_request: Request):
     """
     Generate a video from a text prompt using text-to-video models
 
     Returns the video directly as an MP4 file
     """
-    try:
-        # Check if HF_TOKEN is set
-        if not os.environ.get("HF_TOKEN"):
-            raise HTTPException(
-                status_code=500,
-                detail="HF_TOKEN environment variable not set"
-            )
-
-        # Generate video using Hugging Face Inference API
-        # text_to_video returns bytes directly
-        video = video_client.text_to_video(
-            request.prompt,
-            model=request.model,
+    # Check if HF_TOKEN is set
+    if not HF_TOKEN:
+        raise HTTPException(
+            status_code=500,
+            detail="HF_TOKEN environment variable not set"
         )
 
-        # Convert bytes to BytesIO for streaming
-        video_bytes = io.BytesIO(video)
+    try:
+        # Generate video using Hugging Face Inference API
+        state = http_request.app.state
+        async with state.video_limiter:
+            video = await text_to_video(
+                state.video_client,
+                request.prompt,
+                model=request.model,
+            )
 
-        # Return video as streaming response
-        return StreamingResponse(
-            video_bytes,
+        # Return the video bytes as-is, no need to stream an in-memory buffer
+        return Response(
+            content=video,
             media_type="video/mp4",
-            headers={
-                "Content-Disposition": f"inline; filename=generated_video.mp4"
-            }
+            headers=VIDEO_HEADERS
         )
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Video generation failed: {str(e)}"
-        )
+    except httpx.HTTPError as e:
+        raise upstream_error(e, "Video generation") from e
 
 # Optional: Add CORS middleware if you need to access from browser
 # Uncomment the following lines if needed:
@@ -855,4 +1671,12 @@ async def generate_video(request: VideoGenerationRequest):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Multiple workers parallelize image encoding across cores; caches are per worker
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.environ.get("WEB_CONCURRENCY", min(os.cpu_count() or 2, 4))),
+        loop="uvloop",
+        http="httptools",
+    )
@@ -22,7 +22,7 @@ def test_health():
         print(f"Error: {e}")
         return False
 
-def test_generate(prompt="A beautiful sunset over the ocean", output_file="test_generated.png"):
+def test_generate(prompt="A beautiful sunset over the ocean", output_file="test_generated.jpg"):
     """Test the image generation endpoint"""
     print(f"\nTesting /generate endpoint with prompt: '{prompt}'...")
     try:
@@ -31,9 +31,7 @@ def test_generate(prompt="A beautiful sunset over the ocean", output_file="test_
             json={
                 "prompt": prompt,
                 "width": 1024,
-                "height": 576,
-                "guidance_scale": 7.5,
-                "num_inference_steps": 4
+                "height": 576
             }
         )
 
@@ -119,7 +117,7 @@ def main():
         print("✓ All tests passed!")
         print("\nYou can now:")
         print(f"  - View API docs at: {API_URL}/docs")
-        print(f"  - Check the generated image: test_generated.png")
+        print(f"  - Check the generated image: test_generated.jpg")
         if test_video == 'y':
             print(f"  - Check the generated video: test_generated.mp4")
     else:
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Offline test of the semantic cache path with a pinned image provider
+Usage: python -m unittest test_semantic_cache
+"""
+
+import io
+import json
+import unittest
+from unittest import mock
+
+import httpx
+from PIL import Image
+from huggingface_hub.inference._providers import hf_inference
+
+import main
+
+# Paraphrases share an embedding, anything else is orthogonal to them
+EMBEDDINGS = {
+    "a cat": [1.0, 0.0, 0.0],
+    "a kitten": [1.0, 0.0, 0.0],
+}
+
+class FakeImageHelper:
+    """Stands in for the pinned provider's text-to-image helper"""
+
+    def __init__(self):
+        self.generations = 0
+
+    def prepare_request(self, **kwargs):
+        return kwargs
+
+    def get_response(self, response, request_parameters):
+        self.generations += 1
+        buffer = io.BytesIO()
+        Image.new("RGB", (256, 256), (10, 20, 30)).save(buffer, format="JPEG")
+        return buffer.getvalue()
+
+class SemanticCacheProviderTest(unittest.IsolatedAsyncioTestCase):
+    async def test_semantic_cache_with_non_auto_image_provider(self):
+        embedded = []
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            # Only feature extraction should reach the network, and only via HF Inference
+            self.assertIn("/hf-inference/", request.url.path)
+            self.assertTrue(request.url.path.endswith("/pipeline/feature-extraction"))
+            prompt = json.loads(request.content)["inputs"]
+            embedded.append(prompt)
+            return httpx.Response(200, json=EMBEDDINGS.get(prompt, [0.0, 1.0, 0.0]))
+
+        helper = FakeImageHelper()
+
+        async def inner_post(request_parameters):
+            return b"{}"
+
+        with mock.patch.multiple(
+            main,
+            HF_TOKEN="hf_test",
+            IMAGE_PROVIDER="fal-ai",
+            SEMANTIC_CACHE_THRESHOLD="0.9",
+            SEMANTIC_CACHE_DIR=None,
+            resolve_provider=lambda model, provider: provider,
+            warm_model_info=lambda provider, task, model: None,
+            create_http_client=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handle)),
+            get_provider_helper=lambda provider, task, model: helper,
+        ), mock.patch.object(hf_inference, "_check_supported_task", lambda model, task: None):
+            async with main.app.router.lifespan_context(main.app):
+                state = main.app.state
+                self.assertEqual(state.image_client.provider, "fal-ai")
+                self.assertEqual(state.semantic_cache.client.provider, "hf-inference")
+                state.image_client._inner_post = inner_post
+
+                transport = httpx.ASGITransport(app=main.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    first = await client.post("/generate", json={"prompt": "a cat", "width": 256, "height": 256})
+                    # The image is indexed in the background after the response
+                    await state.semantic_cache.drain()
+                    paraphrase = await client.post("/generate", json={"prompt": "a kitten", "width": 256, "height": 256})
+                    other = await client.post("/generate", json={"prompt": "a dog", "width": 256, "height": 256})
+
+        self.assertEqual([first.status_code, paraphrase.status_code, other.status_code], [200, 200, 200])
+        # The paraphrase is served from the semantic cache without generating
+        self.assertEqual(paraphrase.content, first.content)
+        self.assertEqual(helper.generations, 2)
+        self.assertEqual(embedded, ["a cat", "a kitten", "a dog"])
+
+if __name__ == "__main__":
+    unittest.main()
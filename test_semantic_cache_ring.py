@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Offline test of the semantic cache's FIFO ring and its on-disk reload
+Usage: python -m unittest test_semantic_cache_ring
+"""
+
+import tempfile
+import unittest
+
+import numpy as np
+
+import main
+
+VARIANT = (256, 256, "jpeg", None)
+
+class OneHotEmbeddings:
+    """Embeds prompt "p<i>" as the i-th unit vector, so every prompt is distinct"""
+
+    async def feature_extraction(self, text, model=None):
+        embedding = np.zeros(16, dtype=np.float32)
+        embedding[int(text[1:])] = 1.0
+        return embedding
+
+class SemanticCacheRingTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def open_cache(self, max_entries: int) -> main.SemanticCache:
+        cache = main.SemanticCache(
+            OneHotEmbeddings(), 0.99, directory=self.directory.name, max_entries=max_entries
+        )
+        self.addCleanup(cache.close)
+        return cache
+
+    async def cached(self, cache: main.SemanticCache, count: int) -> list[bytes | None]:
+        return [await cache.lookup(f"p{i}", VARIANT) for i in range(count)]
+
+    async def test_ring_wraps_and_evicts_oldest_first(self):
+        cache = self.open_cache(max_entries=3)
+        for i in range(5):
+            await cache.add(f"p{i}", VARIANT, f"image {i}".encode())
+
+        # p0 and p1 were overwritten in place and removed from disk
+        self.assertEqual(await self.cached(cache, 5), [None, None, b"image 2", b"image 3", b"image 4"])
+        self.assertEqual(len(list(cache._store.iterkeys())), 3 * 2)
+
+    async def test_reload_keeps_newest_entries_in_insertion_order(self):
+        cache = self.open_cache(max_entries=4)
+        for i in range(4):
+            await cache.add(f"p{i}", VARIANT, f"image {i}".encode())
+        cache.close()
+
+        # Reopening with a smaller ring keeps only the newest entries
+        reloaded = self.open_cache(max_entries=2)
+        self.assertEqual(await self.cached(reloaded, 4), [None, None, b"image 2", b"image 3"])
+        self.assertEqual(len(list(reloaded._store.iterkeys())), 2 * 2)
+
+        # FIFO order survives the reload: the next add evicts p2, not p3
+        await reloaded.add("p4", VARIANT, b"image 4")
+        self.assertEqual(await self.cached(reloaded, 5), [None, None, None, b"image 3", b"image 4"])
+
+    async def test_reload_drops_entries_without_a_sequence_number(self):
+        cache = self.open_cache(max_entries=4)
+        await cache.add("p0", VARIANT, b"image 0")
+        # An entry in the format used before sequence numbers were stored
+        cache._store.set("legacy", b"old image")
+        cache._store.set("emb:legacy", (np.ones(16, dtype=np.float16).tobytes(), *VARIANT))
+        cache.close()
+
+        reloaded = self.open_cache(max_entries=4)
+        self.assertEqual(await self.cached(reloaded, 1), [b"image 0"])
+        self.assertIsNone(reloaded._store.get("legacy"))
+
+if __name__ == "__main__":
+    unittest.main()